@@ -1,7 +1,12 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import os
+import sys
+import json
 import types
+import time
+import argparse
 import gobject
 import subprocess
 import dbus
@@ -42,6 +47,1026 @@ class BluetoothException(Exception):
 
 
 
+##
+#	Function which reads a dictionary persisted as JSON
+#	@param path Path of the file
+#	@retval Dictionary with the content of the file, empty if it does not exist or it is not valid
+#	@date 19/10/2026
+#	@version 1.0
+def loadJSON(path):
+	
+	try:
+		with open(path) as jsonFile:
+			return json.load(jsonFile)
+	except (IOError, ValueError):
+		return {}
+
+
+##
+#	Function which persists a dictionary as JSON. The data is written in a temporary file of this process which then
+#	replaces the file, so a crash or another process writing at the same time never leaves it truncated
+#	@param path Path of the file
+#	@param data Dictionary to persist
+#	@date 19/10/2026
+#	@version 1.0
+def saveJSON(path, data):
+	
+	temporary= '%s.%d.tmp' % (path, os.getpid())
+	try:
+		with open(temporary, 'w') as jsonFile:
+			json.dump(data, jsonFile)
+		os.rename(temporary, path)
+	except (IOError, OSError):
+		try:
+			os.remove(temporary)
+		except OSError:
+			pass
+
+
+
+
+
+
+
+
+##
+#	Class which describes the devices that a search process must report. The allowed MAC addresses are pushed down to
+#	the bus (arg0 match of DeviceFound), the UUIDs and the RSSI to the adapter if its object exports org.bluez.Adapter1
+#	(never on BlueZ 4) and, in any case, all the criteria are compiled into a predicate that discards the irrelevant
+#	devices before building any record
+#	@date 19/10/2026
+#	@version 1.0
+class DiscoveryFilter():
+	
+	""" Class attributes """
+	
+	# Major device classes of the CoD (bits 8-12)
+	MAJOR_COMPUTER= 0x01
+	MAJOR_PHONE= 0x02
+	MAJOR_NETWORK= 0x03
+	MAJOR_AUDIO= 0x04
+	MAJOR_PERIPHERAL= 0x05
+	MAJOR_IMAGING= 0x06
+	
+	# Base UUID used to expand the 16/32 bits service UUIDs
+	_baseUUID= '-0000-1000-8000-00805f9b34fb'
+	
+	
+	
+	""" Class Builder """
+	##
+	#	Builder of the class whose objective is save the criteria of the filter
+	#	@param majorClass Major device class (or list of them) of the CoD accepted (by default, all)
+	#	@param rssi Minimum RSSI accepted in dBm (by default, None)
+	#	@param uuids Service UUID (or list of them); the device must announce one of them (by default, None)
+	#	@param namePrefix Prefix of the name of the device (by default, None)
+	#	@param allow MAC bluetooth address (or list of them) accepted, the rest are discarded (by default, None)
+	#	@param deny MAC bluetooth address (or list of them) discarded (by default, None)
+	#	@exception BluetoothException
+	#	@date 19/10/2026
+	#	@version 1.0
+	def __init__(self, majorClass= None, rssi= None, uuids= None, namePrefix= None, allow= None, deny= None):
+		
+		# Check the types of the criteria
+		if majorClass is not None and type(majorClass) is types.IntType:
+			majorClass= [majorClass]
+			
+		if rssi is not None and type(rssi) is not types.IntType:
+			raise BluetoothException("The rssi has an incorrect type (must be an int)")
+			
+		if namePrefix is not None and type(namePrefix) not in types.StringTypes:
+			raise BluetoothException("The namePrefix has an incorrect type (must be a string)")
+			
+		if uuids is not None and type(uuids) in types.StringTypes:
+			uuids= [uuids]
+			
+		if allow is not None and type(allow) in types.StringTypes:
+			allow= [allow]
+			
+		if deny is not None and type(deny) in types.StringTypes:
+			deny= [deny]
+		
+		# Save the criteria normalized
+		self.majorClass= None if majorClass is None else frozenset(majorClass)
+		self.rssi= rssi
+		self.uuids= None if uuids is None else frozenset([DiscoveryFilter.normalizeUUID(uuid) for uuid in uuids])
+		self.namePrefix= namePrefix
+		self.allow= None if allow is None else frozenset([address.upper() for address in allow])
+		self.deny= None if deny is None else frozenset([address.upper() for address in deny])
+		
+		# Compile the predicate
+		self.match= self.compile()
+	
+	
+	##
+	#	Method which returns the 128 bits lower case form of a service UUID
+	#	@param uuid String with the UUID in its 16, 32 or 128 bits form
+	#	@retval String with the UUID in its 128 bits form
+	#	@date 19/10/2026
+	#	@version 1.0
+	@staticmethod
+	def normalizeUUID(uuid):
+		
+		uuid= str(uuid).lower()
+		if uuid.startswith('0x'):
+			uuid= uuid[2:]
+			
+		if len(uuid) <= 8:
+			return uuid.zfill(8) + DiscoveryFilter._baseUUID
+		else:
+			return uuid
+	
+	
+	##
+	#	Method which returns the criteria that the adapter is able to apply by itself (SetDiscoveryFilter)
+	#	@retval Dictionary with the filter in the BlueZ 5 format
+	#	@date 19/10/2026
+	#	@version 1.0
+	def toDBus(self):
+		
+		criteria= {}
+		if self.uuids is not None:
+			criteria['UUIDs']= dbus.Array(sorted(self.uuids), signature= 's')
+			
+		if self.rssi is not None:
+			criteria['RSSI']= dbus.Int16(self.rssi)
+			
+		return dbus.Dictionary(criteria, signature= 'sv')
+	
+	
+	##
+	#	Method which builds the predicate that checks the properties of a discovered device. Only the criteria
+	#	given are checked, beginning by the cheapest ones
+	#	@retval Function which receives the MAC address and the properties and returns True if the device is accepted
+	#	@date 19/10/2026
+	#	@version 1.0
+	def compile(self):
+		
+		checks= []
+		
+		# MAC lists
+		if self.deny is not None:
+			deny= self.deny
+			checks.append(lambda address, properties: address.upper() not in deny)
+			
+		if self.allow is not None:
+			allow= self.allow
+			checks.append(lambda address, properties: address.upper() in allow)
+		
+		# CoD major class
+		if self.majorClass is not None:
+			majorClass= self.majorClass
+			checks.append(lambda address, properties: ((properties.get('Class', 0) >> 8) & 0x1F) in majorClass)
+		
+		# RSSI floor
+		if self.rssi is not None:
+			rssi= self.rssi
+			checks.append(lambda address, properties: properties.get('RSSI', -128) >= rssi)
+		
+		# Name prefix
+		if self.namePrefix is not None:
+			namePrefix= self.namePrefix
+			checks.append(lambda address, properties: properties.get('Name', u'').startswith(namePrefix))
+		
+		# Service UUIDs
+		if self.uuids is not None:
+			uuids= self.uuids
+			normalize= DiscoveryFilter.normalizeUUID
+			checks.append(lambda address, properties: any(normalize(uuid) in uuids for uuid in properties.get('UUIDs', [])))
+		
+		# Build the predicate
+		if len(checks) is 0:
+			return lambda address, properties: True
+			
+		elif len(checks) is 1:
+			return checks[0]
+			
+		else:
+			return lambda address, properties: all(check(address, properties) for check in checks)
+
+
+
+
+
+
+
+
+##
+#	Class which coordinates the activities of one bluetooth adapter. The inquiry scanning reduces the throughput
+#	of the ACL links, so the discovery is suspended or duty-cycled while there are transfers or connections in
+#	action, and the new inquiries are queued until the radio is free
+#	@date 19/10/2026
+#	@version 1.0
+class RadioScheduler():
+	
+	""" Class attributes """
+	
+	# Policies applied to the discovery while there are transfers in action
+	POLICY_NONE= 'none'
+	POLICY_SUSPEND= 'suspend'
+	POLICY_DUTYCYCLE= 'dutycycle'
+	
+	# Kinds of operations which use the radio
+	TRANSFER= 'transfer'
+	CONNECTION= 'connection'
+	AUDIO= 'audio'
+	
+	
+	
+	""" Class Builder """
+	##
+	#	Builder of the class whose objective is save the reference to the adapter and the policy to apply
+	#	@param adapter org.bluez.Adapter interface of the bluetooth adapter
+	#	@param policy Policy applied to the discovery while there are transfers in action (by default, suspend)
+	#	@param dutyOn Seconds of discovery in every cycle of the dutycycle policy (by default, 1s)
+	#	@param dutyOff Seconds without discovery in every cycle of the dutycycle policy (by default, 4s)
+	#	@exception BluetoothException
+	#	@date 19/10/2026
+	#	@version 1.0
+	def __init__(self, adapter, policy= POLICY_SUSPEND, dutyOn= 1, dutyOff= 4):
+		
+		self.adapter= adapter
+		self.setPolicy(policy, dutyOn, dutyOff)
+		
+		# Initialize the internal state
+		self.operations= {RadioScheduler.TRANSFER: 0, RadioScheduler.CONNECTION: 0, RadioScheduler.AUDIO: 0}
+		self.discovering= False
+		self.scanning= False
+		self.pending= []
+		self.dutyTimer= None
+		
+		# Initialize the contention statistics
+		self.pausedSince= None
+		self.pausedTime= 0.0
+		self.queuedTime= 0.0
+		self.suspensions= 0
+		self.queued= 0
+		
+		# Initialize the statistics of the inquiries of other processes
+		self.externalTime= 0.0
+		self.externalContendedTime= 0.0
+		self.accountedAt= time.time()
+		try:
+			self.adapterDiscovering= self.adapter.GetProperties().get('Discovering', 0) == 1
+		except:
+			self.adapterDiscovering= False
+	
+	
+	##
+	#	Method which sets the policy applied to the discovery while there are transfers in action
+	#	@param policy POLICY_NONE, POLICY_SUSPEND or POLICY_DUTYCYCLE
+	#	@param dutyOn Seconds of discovery in every cycle of the dutycycle policy (by default, the current one)
+	#	@param dutyOff Seconds without discovery in every cycle of the dutycycle policy (by default, the current one)
+	#	@exception BluetoothException
+	#	@date 19/10/2026
+	#	@version 1.0
+	def setPolicy(self, policy, dutyOn= None, dutyOff= None):
+		
+		if policy not in (RadioScheduler.POLICY_NONE, RadioScheduler.POLICY_SUSPEND, RadioScheduler.POLICY_DUTYCYCLE):
+			raise BluetoothException("Unknown scheduling policy")
+			
+		self.policy= policy
+		if dutyOn is not None:
+			self.dutyOn= dutyOn
+		if dutyOff is not None:
+			self.dutyOff= dutyOff
+	
+	
+	##
+	#	Method which asks for permission to start up a discovery process. If the radio is busy or there is another
+	#	discovery process, the request is queued and it will be started when the radio is free
+	#	@param started Function which will be called when the discovery process is started
+	#	@retval True If the discovery process has been started right now
+	#	@retval False If the discovery process has been queued
+	#	@exception BluetoothException
+	#	@date 19/10/2026
+	#	@version 1.0
+	def requestDiscovery(self, started):
+		
+		if self.discovering is False and self.isBusy() is False:
+			if self.startDiscovery(started) is False:
+				raise BluetoothException("The discovery process can not be started")
+			return True
+			
+		else:
+			self.queued+= 1
+			self.pending.append( (started, time.time()) )
+			return False
+	
+	
+	##
+	#	Method which removes a queued discovery process which has not been started yet
+	#	@param started Function given to requestDiscovery
+	#	@retval True If the discovery process has been removed from the queue
+	#	@retval False If the discovery process was not queued
+	#	@date 19/10/2026
+	#	@version 1.0
+	def cancelDiscovery(self, started):
+		
+		for request in self.pending:
+			if request[0] == started:
+				self.pending.remove(request)
+				self.queuedTime+= time.time() - request[1]
+				return True
+				
+		return False
+	
+	
+	##
+	#	Method which receives the changes of the Discovering property of the adapter, which is also True while other
+	#	processes are searching. Those inquiries can not be paused from here, but they are reported by getContention
+	#	@param discovering Value of the Discovering property
+	#	@date 19/10/2026
+	#	@version 1.0
+	def discoveringChanged(self, discovering):
+		
+		self.account()
+		self.adapterDiscovering= discovering == 1
+	
+	
+	##
+	#	Method which accumulates the time that the adapter has been searching for other processes
+	#	@date 19/10/2026
+	#	@version 1.0
+	def account(self):
+		
+		now= time.time()
+		if self.adapterDiscovering is True and self.scanning is False:
+			self.externalTime+= now - self.accountedAt
+			if sum(self.operations.values()) > 0:
+				self.externalContendedTime+= now - self.accountedAt
+				
+		self.accountedAt= now
+	
+	
+	##
+	#	Method which indicates that the current discovery process has finished
+	#	@date 19/10/2026
+	#	@version 1.0
+	def endDiscovery(self):
+		
+		self.account()
+		self.stopDutyCycle()
+		if self.scanning is True:
+			self.scanning= False
+			try:
+				self.adapter.StopDiscovery()
+			except:
+				pass
+				
+		self.resumed()
+		self.discovering= False
+		
+		# Start up the next queued discovery process
+		self.dispatch()
+	
+	
+	##
+	#	Method which indicates that an operation which uses the radio has begun
+	#	@param kind TRANSFER, CONNECTION or AUDIO
+	#	@date 19/10/2026
+	#	@version 1.0
+	def beginOperation(self, kind):
+		
+		self.account()
+		self.operations[kind]+= 1
+		
+		# Free the radio for the operation
+		if self.discovering is True:
+			if kind == RadioScheduler.AUDIO or self.policy == RadioScheduler.POLICY_SUSPEND:
+				self.stopDutyCycle()
+				self.pause()
+				
+			elif self.policy == RadioScheduler.POLICY_DUTYCYCLE and self.dutyTimer is None:
+				self.pause()
+				self.dutyTimer= gobject.timeout_add(int(self.dutyOff * 1000), self.dutyCycle)
+	
+	
+	##
+	#	Method which indicates that an operation which uses the radio has finished
+	#	@param kind TRANSFER, CONNECTION or AUDIO
+	#	@date 19/10/2026
+	#	@version 1.0
+	def endOperation(self, kind):
+		
+		self.account()
+		if self.operations[kind] > 0:
+			self.operations[kind]-= 1
+			
+		# Resume the discovery process or start up the queued one
+		if self.isBusy() is False:
+			if self.discovering is True:
+				self.stopDutyCycle()
+				self.resume()
+			else:
+				self.dispatch()
+				
+		# Only the audio connections were suspending the duty cycle
+		elif kind == RadioScheduler.AUDIO and self.operations[RadioScheduler.AUDIO] == 0:
+			if self.discovering is True and self.policy == RadioScheduler.POLICY_DUTYCYCLE and self.dutyTimer is None:
+				self.dutyTimer= gobject.timeout_add(int(self.dutyOff * 1000), self.dutyCycle)
+	
+	
+	##
+	#	Method which checks if there are operations which need the radio free of inquiries
+	#	@retval True If the radio is busy
+	#	@retval False If the radio is free
+	#	@date 19/10/2026
+	#	@version 1.0
+	def isBusy(self):
+		
+		if self.operations[RadioScheduler.AUDIO] > 0:
+			return True
+		elif self.policy == RadioScheduler.POLICY_NONE:
+			return False
+		else:
+			return (self.operations[RadioScheduler.TRANSFER] + self.operations[RadioScheduler.CONNECTION]) > 0
+	
+	
+	##
+	#	Method which returns the statistics about the time lost by the contention of the radio
+	#	@retval Dictionary with the seconds that the discovery has been paused and queued, the number of times, and the
+	#	seconds that other processes have been searching (in total and during the operations of this process)
+	#	@date 19/10/2026
+	#	@version 1.0
+	def getContention(self):
+		
+		pausedTime= self.pausedTime
+		if self.pausedSince is not None:
+			pausedTime+= time.time() - self.pausedSince
+			
+		queuedTime= self.queuedTime
+		for started, since in self.pending:
+			queuedTime+= time.time() - since
+			
+		self.account()
+		return {'pausedTime': pausedTime, 'queuedTime': queuedTime, 'suspensions': self.suspensions, 'queued': self.queued,
+			'externalTime': self.externalTime, 'externalContendedTime': self.externalContendedTime}
+	
+	
+	##
+	#	Method which starts up the discovery process of the adapter
+	#	@param started Function which will be called when the discovery process is started
+	#	@retval True If the discovery process has been started
+	#	@retval False If the adapter has rejected it (i.e., it is turned off)
+	#	@date 19/10/2026
+	#	@version 1.0
+	def startDiscovery(self, started):
+		
+		self.account()
+		try:
+			self.adapter.StartDiscovery()
+		except dbus.exceptions.DBusException:
+			return False
+			
+		self.discovering= True
+		self.scanning= True
+		started()
+		return True
+	
+	
+	##
+	#	Method which starts up the oldest queued discovery process if the radio is free. The requests rejected by the
+	#	adapter are dropped, and their searches end without results at their deadline
+	#	@date 19/10/2026
+	#	@version 1.0
+	def dispatch(self):
+		
+		while self.discovering is False and self.isBusy() is False and len(self.pending) > 0:
+			started, since= self.pending.pop(0)
+			self.queuedTime+= time.time() - since
+			self.startDiscovery(started)
+	
+	
+	##
+	#	Method which stops the inquiry scanning of the current discovery process
+	#	@date 19/10/2026
+	#	@version 1.0
+	def pause(self):
+		
+		self.account()
+		if self.scanning is True:
+			self.scanning= False
+			try:
+				self.adapter.StopDiscovery()
+			except:
+				pass
+				
+		if self.pausedSince is None:
+			self.suspensions+= 1
+			self.pausedSince= time.time()
+	
+	
+	##
+	#	Method which restarts the inquiry scanning of the current discovery process
+	#	@date 19/10/2026
+	#	@version 1.0
+	def resume(self):
+		
+		self.account()
+		if self.scanning is False:
+			try:
+				self.adapter.StartDiscovery()
+				self.scanning= True
+			except:
+				pass
+				
+		self.resumed()
+	
+	
+	##
+	#	Method which accumulates the time that the discovery process has been paused
+	#	@date 19/10/2026
+	#	@version 1.0
+	def resumed(self):
+		
+		if self.pausedSince is not None:
+			self.pausedTime+= time.time() - self.pausedSince
+			self.pausedSince= None
+	
+	
+	##
+	#	Method which will called by the timer of the dutycycle policy and alternates the inquiry scanning
+	#	@retval False To remove the current timer
+	#	@date 19/10/2026
+	#	@version 1.0
+	def dutyCycle(self):
+		
+		if self.scanning is True:
+			self.pause()
+			self.dutyTimer= gobject.timeout_add(int(self.dutyOff * 1000), self.dutyCycle)
+		else:
+			self.resume()
+			self.dutyTimer= gobject.timeout_add(int(self.dutyOn * 1000), self.dutyCycle)
+			
+		return False
+	
+	
+	##
+	#	Method which removes the timer of the dutycycle policy
+	#	@date 19/10/2026
+	#	@version 1.0
+	def stopDutyCycle(self):
+		
+		if self.dutyTimer is not None:
+			gobject.source_remove(self.dutyTimer)
+			self.dutyTimer= None
+
+
+
+
+
+
+
+
+##
+#	Class which keeps the signal receivers grouped by the operation or session that owns them, so they can be
+#	removed from the bus when that operation ends
+#	@date 19/10/2026
+#	@version 1.0
+class SignalRegistry():
+	
+	""" Class Builder """
+	##
+	#	Builder of the class whose objective is initialize the scopes of the receivers
+	#	@date 19/10/2026
+	#	@version 1.0
+	def __init__(self):
+		
+		self.scopes= {}
+	
+	
+	##
+	#	Method which saves a signal receiver into a scope
+	#	@param scope Name of the operation or session that owns the receiver
+	#	@param match SignalMatch object returned by connect_to_signal or add_signal_receiver
+	#	@retval SignalMatch The given receiver
+	#	@date 19/10/2026
+	#	@version 1.0
+	def add(self, scope, match):
+		
+		self.scopes.setdefault(scope, []).append(match)
+		return match
+	
+	
+	##
+	#	Method which removes from the bus all the signal receivers of a scope
+	#	@param scope Name of the operation or session that owns the receivers
+	#	@date 19/10/2026
+	#	@version 1.0
+	def release(self, scope):
+		
+		for match in self.scopes.pop(scope, []):
+			try:
+				match.remove()
+			except:
+				pass
+	
+	
+	##
+	#	Method which removes from the bus all the signal receivers
+	#	@date 19/10/2026
+	#	@version 1.0
+	def releaseAll(self):
+		
+		for scope in self.scopes.keys():
+			self.release(scope)
+	
+	
+	##
+	#	Method which returns the number of live signal receivers
+	#	@retval Dictionary with the number of receivers of every scope
+	#	@date 19/10/2026
+	#	@version 1.0
+	def getCounts(self):
+		
+		return dict( (scope, len(matches)) for scope, matches in self.scopes.items() if len(matches) > 0 )
+
+
+
+
+
+
+
+
+##
+#	Class which keeps, persisted across runs, the service records (SDP) and the UUIDs of every device keyed by its
+#	MAC address, so the services of a known device are not browsed again and its profile can be chosen from them
+#	@date 19/10/2026
+#	@version 1.0
+class ServiceCache():
+	
+	""" Class attributes """
+	
+	# Profiles and the service UUIDs which identify them, by order of preference
+	_profiles= [
+		('audio', ['0000110b', '0000110d', '00001108', '0000111e']), # A2DP Sink, Advanced Audio, Headset, Handsfree
+		('input', ['00001124']), # HID
+		('opp', ['00001105']) # Object Push
+	]
+	
+	
+	
+	""" Class Builder """
+	##
+	#	Builder of the class whose objective is load the cache from the disk
+	#	@param path Path of the file where the cache is persisted
+	#	@date 19/10/2026
+	#	@version 1.0
+	def __init__(self, path):
+		
+		self.path= path
+		self.devices= loadJSON(path)
+	
+	
+	##
+	#	Method which writes the cache into the disk
+	#	@date 19/10/2026
+	#	@version 1.0
+	def save(self):
+		
+		saveJSON(self.path, self.devices)
+	
+	
+	##
+	#	Method which returns the cached information of a device
+	#	@param address MAC bluetooth address of the device
+	#	@retval Dictionary with the UUIDs and the service records of the device
+	#	@retval None If the device is not in the cache
+	#	@date 19/10/2026
+	#	@version 1.0
+	def get(self, address):
+		
+		return self.devices.get(address.upper())
+	
+	
+	##
+	#	Method which saves the services of a device
+	#	@param address MAC bluetooth address of the device
+	#	@param uuids List with the service UUIDs of the device
+	#	@param records Dictionary with the service records (XML) by handle (by default, the cached ones)
+	#	@date 19/10/2026
+	#	@version 1.0
+	def update(self, address, uuids, records= None):
+		
+		entry= self.get(address)
+		if records is None:
+			records= {} if entry is None else entry['records']
+			
+		self.devices[address.upper()]= {
+			'uuids': sorted(set( [DiscoveryFilter.normalizeUUID(uuid) for uuid in uuids] )),
+			'records': dict( (str(handle), unicode(record)) for handle, record in records.items() ),
+			'updated': time.time()
+		}
+		self.save()
+	
+	
+	##
+	#	Method which removes a device from the cache
+	#	@param address MAC bluetooth address of the device
+	#	@date 19/10/2026
+	#	@version 1.0
+	def remove(self, address):
+		
+		if self.devices.pop(address.upper(), None) is not None:
+			self.save()
+	
+	
+	##
+	#	Method which chooses the profile of a device according to its service UUIDs
+	#	@param address MAC bluetooth address of the device
+	#	@retval String with the profile ('audio', 'input' or 'opp')
+	#	@retval None If the device is not in the cache or it has not a known profile
+	#	@date 19/10/2026
+	#	@version 1.0
+	def getProfile(self, address):
+		
+		entry= self.get(address)
+		if entry is None:
+			return None
+			
+		prefixes= set( [uuid[:8] for uuid in entry['uuids']] )
+		for profile, uuids in ServiceCache._profiles:
+			if not prefixes.isdisjoint(uuids):
+				return profile
+				
+		return None
+
+
+
+
+
+
+
+
+##
+#	Class which remembers the last connected audio and input devices and reconnects all of them in parallel when the
+#	bluetooth adapter is turned on. The absent devices are retried with an exponential backoff
+#	@date 19/10/2026
+#	@version 1.0
+class AutoReconnect():
+	
+	""" Class attributes """
+	
+	# BlueZ interfaces and default priorities (lower first) of the profiles
+	_interfaces= {'audio': 'org.bluez.Audio', 'input': 'org.bluez.Input'}
+	_priorities= {'input': 0, 'audio': 1}
+	
+	# Maximum seconds that BlueZ spends in one connection attempt to an absent device
+	_connectTime= 10
+	
+	
+	
+	""" Class Builder """
+	##
+	#	Builder of the class whose objective is load the remembered devices from the disk
+	#	@param bluetooth Bluetooth object whose adapter is used to reconnect the devices
+	#	@param path Path of the file where the remembered devices are persisted
+	#	@param baseDelay Seconds to wait before the first retry of an absent device (by default, 2s)
+	#	@param maxDelay Maximum seconds between two retries (by default, 60s)
+	#	@param maxAttempts Number of attempts before giving up a device (by default, 6)
+	#	@date 19/10/2026
+	#	@version 1.0
+	def __init__(self, bluetooth, path, baseDelay= 2, maxDelay= 60, maxAttempts= 6):
+		
+		self.bluetooth= bluetooth
+		self.path= path
+		self.baseDelay= baseDelay
+		self.maxDelay= maxDelay
+		self.maxAttempts= maxAttempts
+		self.enabled= True
+		
+		self.devices= loadJSON(path)
+		
+		# Initialize the state of the reconnection process
+		self.results= {}
+		self.timers= {}
+		self.inFlight= set()
+		self.waitLoop= None
+		self.waitTimer= None
+	
+	
+	##
+	#	Method which writes the remembered devices into the disk
+	#	@date 19/10/2026
+	#	@version 1.0
+	def save(self):
+		
+		saveJSON(self.path, self.devices)
+	
+	
+	##
+	#	Method which remembers a connected device
+	#	@param address MAC bluetooth address of the device
+	#	@param profile Profile of the connection ('audio' or 'input')
+	#	@param priority Priority of the device, lower first (by default, the one of its profile)
+	#	@date 19/10/2026
+	#	@version 1.0
+	def remember(self, address, profile, priority= None):
+		
+		if profile not in AutoReconnect._interfaces:
+			return
+			
+		entry= self.devices.get(address.upper(), {})
+		if priority is None:
+			priority= entry.get('priority', AutoReconnect._priorities[profile])
+			
+		self.devices[address.upper()]= {'profile': profile, 'priority': priority, 'lastUsed': time.time()}
+		self.save()
+	
+	
+	##
+	#	Method which forgets a device, so it will not be reconnected
+	#	@param address MAC bluetooth address of the device
+	#	@date 19/10/2026
+	#	@version 1.0
+	def forget(self, address):
+		
+		self.cancel(address.upper())
+		if self.devices.pop(address.upper(), None) is not None:
+			self.save()
+			
+		# Give up the pending reconnection
+		if address.upper() in self.results and self.results[address.upper()] is None:
+			self.finish(address.upper(), False)
+	
+	
+	##
+	#	Method which returns the remembered devices in the order in which they are reconnected
+	#	@retval List List object with the MAC addresses sorted by priority and most recent use
+	#	@date 19/10/2026
+	#	@version 1.0
+	def getDevices(self):
+		
+		return sorted(self.devices.keys(), key= lambda address: (self.devices[address]['priority'], -self.devices[address]['lastUsed']))
+	
+	
+	##
+	#	Method which starts up the reconnection of all the remembered devices. The connections are requested back to
+	#	back, so BlueZ pages the devices in the given order without waiting for the previous ones in Python. The replies
+	#	and the retries are only processed while a main loop is running: the caller must run one or call wait()
+	#	@date 19/10/2026
+	#	@version 1.0
+	def trigger(self):
+		
+		for address in self.getDevices():
+			self.cancel(address)
+			self.results[address]= None
+			self.connect(address, 0)
+	
+	
+	##
+	#	Method which waits until all the devices are reconnected or given up
+	#	@param timeOut Maximum seconds to wait (by default, the duration of all the attempts given by getDuration)
+	#	@retval Dictionary with the result (True, False or None if it is still pending) of every device
+	#	@date 19/10/2026
+	#	@version 1.0
+	def wait(self, timeOut= None):
+		
+		if timeOut is None:
+			timeOut= self.getDuration()
+			
+		if None in self.results.values():
+			self.waitLoop= gobject.MainLoop()
+			self.waitTimer= gobject.timeout_add(timeOut * 1000, self.waitTimeOut)
+			self.waitLoop.run()
+			self.waitLoop= None
+			
+			if self.waitTimer is not None:
+				gobject.source_remove(self.waitTimer)
+				self.waitTimer= None
+			
+		return dict(self.results)
+	
+	
+	##
+	#	Method which returns the maximum duration of the reconnection of an absent device: the delays of the backoff
+	#	and the time of every attempt
+	#	@retval Seconds until the device is given up
+	#	@date 19/10/2026
+	#	@version 1.0
+	def getDuration(self):
+		
+		delays= sum( [min(self.baseDelay * (2 ** attempt), self.maxDelay) for attempt in range(self.maxAttempts - 1)] )
+		return delays + self.maxAttempts * AutoReconnect._connectTime
+	
+	
+	##
+	#	Method which requests the connection of a device without blocking
+	#	@param address MAC bluetooth address of the device
+	#	@param attempt Number of the previous failed attempts
+	#	@retval False To remove the timer of the retry
+	#	@date 19/10/2026
+	#	@version 1.0
+	def connect(self, address, attempt):
+		
+		self.timers.pop(address, None)
+		if address in self.inFlight or address not in self.devices:
+			return False
+		
+		# The device must be registered in the system
+		try:
+			reference= self.bluetooth.adapter.FindDevice( address )
+		except:
+			self.finish(address, False)
+			return False
+		
+		profile= self.devices[address]['profile']
+		kind= RadioScheduler.AUDIO if profile == 'audio' else RadioScheduler.CONNECTION
+		device= dbus.Interface( Bluetooth._systemBus.get_object('org.bluez', reference), AutoReconnect._interfaces[profile] )
+		
+		self.inFlight.add(address)
+		self.bluetooth.scheduler.beginOperation(kind)
+		device.Connect(reply_handler= lambda: self.connected(address, kind), error_handler= lambda error: self.failed(address, kind, attempt, error))
+		return False
+	
+	
+	##
+	#	Method which will called when a device is reconnected
+	#	@param address MAC bluetooth address of the device
+	#	@param kind Kind of operation of the scheduler
+	#	@date 19/10/2026
+	#	@version 1.0
+	def connected(self, address, kind):
+		
+		self.inFlight.discard(address)
+		self.bluetooth.scheduler.endOperation(kind)
+		
+		if address in self.devices:
+			self.devices[address]['lastUsed']= time.time()
+			self.save()
+			
+		self.finish(address, True)
+	
+	
+	##
+	#	Method which will called when the connection of a device fails and retries it later
+	#	@param address MAC bluetooth address of the device
+	#	@param kind Kind of operation of the scheduler
+	#	@param attempt Number of the previous failed attempts
+	#	@param error DBusException with the information of the error
+	#	@date 19/10/2026
+	#	@version 1.0
+	def failed(self, address, kind, attempt, error):
+		
+		# The device has been reconnected by itself (i.e., the HID devices after turning on the adapter)
+		if error.get_dbus_name() == 'org.bluez.Error.AlreadyConnected':
+			self.connected(address, kind)
+			return
+			
+		self.inFlight.discard(address)
+		self.bluetooth.scheduler.endOperation(kind)
+		
+		if attempt + 1 < self.maxAttempts and address in self.devices:
+			delay= min(self.baseDelay * (2 ** attempt), self.maxDelay)
+			self.timers[address]= gobject.timeout_add(int(delay * 1000), self.connect, address, attempt + 1)
+		else:
+			self.finish(address, False)
+	
+	
+	##
+	#	Method which saves the result of a device and stops the wait when there are no pending devices
+	#	@param address MAC bluetooth address of the device
+	#	@param result True if the device is reconnected, False if it has been given up
+	#	@date 19/10/2026
+	#	@version 1.0
+	def finish(self, address, result):
+		
+		self.results[address]= result
+		if self.waitLoop is not None and None not in self.results.values():
+			self.waitLoop.quit()
+	
+	
+	##
+	#	Method which will called when the timeout of the wait is reached
+	#	@retval False To remove the timer
+	#	@date 19/10/2026
+	#	@version 1.0
+	def waitTimeOut(self):
+		
+		self.waitTimer= None
+		self.waitLoop.quit()
+		return False
+	
+	
+	##
+	#	Method which cancels the pending retry of a device
+	#	@param address MAC bluetooth address of the device
+	#	@date 19/10/2026
+	#	@version 1.0
+	def cancel(self, address):
+		
+		timer= self.timers.pop(address, None)
+		if timer is not None:
+			gobject.source_remove(timer)
+
+
+
+
+
+
+
+
 ##
 #	API responsible of the bluetooth adapter management into UNIX systems based on BlueZ
 #	@date		23/11/2012
@@ -54,12 +1079,19 @@ class Bluetooth():
 	# BlueZ system bus attributes
 	_systemBus= None
 	_manager= None
+	_schedulers= {}
 	
 	# OpenOBEX session bus attributes
 	_sessionBus= None
 	_managerOBEX= None
 	_savePath= '/home/manuel/'
 	
+	# Service records cache attributes
+	_servicesPath= os.path.expanduser('~/.bluetooth_services.json')
+	
+	# Auto-reconnection attributes
+	_reconnectPath= os.path.expanduser('~/.bluetooth_reconnect.json')
+	
 	
 	
 	""" Class Builder """
@@ -80,13 +1112,24 @@ class Bluetooth():
 		Bluetooth._manager= Bluetooth._systemBus.get_object('org.bluez', '/')
 		interfaceManager= dbus.Interface(Bluetooth._manager, 'org.bluez.Manager')
 		
+		# Get the registry of the signal receivers
+		self.signals= SignalRegistry()
+		
+		# Load the services of the known devices
+		self.services= ServiceCache(Bluetooth._servicesPath)
+		
+		# Load the devices to reconnect when the adapter is turned on
+		self.reconnector= AutoReconnect(self, Bluetooth._reconnectPath)
+		
 		# Get the reference to the bluetooth adapter
 		try:
-			adapterReference= interfaceManager.DefaultAdapter()			
-			self.adapter= dbus.Interface(Bluetooth._systemBus.get_object('org.bluez', adapterReference), 'org.bluez.Adapter')
-			self.adapter.connect_to_signal('PropertyChanged', self.propertyListener)
-			self.adapter.connect_to_signal('DeviceFound', self.deviceFound)
-			Bluetooth._systemBus.add_signal_receiver(self.propertyListenerAD2P, dbus_interface= 'org.bluez.Audio', signal_name='PropertyChanged')
+			self.bindAdapter( interfaceManager.DefaultAdapter() )
+			self.signals.add('global', Bluetooth._systemBus.add_signal_receiver(self.propertyListenerAD2P, dbus_interface= 'org.bluez.Audio', signal_name='PropertyChanged'))
+			
+			# Follow the adapter when bluetoothd is restarted (the proxies are bound to the current bluetoothd, so the
+			# signals are matched by the well-known name, which follows the new daemon)
+			self.signals.add('global', Bluetooth._systemBus.add_signal_receiver(self.adapterChanged, signal_name= 'DefaultAdapterChanged', dbus_interface= 'org.bluez.Manager', bus_name= 'org.bluez'))
+			self.signals.add('global', Bluetooth._systemBus.add_signal_receiver(self.adapterChanged, signal_name= 'AdapterAdded', dbus_interface= 'org.bluez.Manager', bus_name= 'org.bluez'))
 		except:
 			raise BluetoothException("The system does not have an bluetooth connection")
 			
@@ -96,12 +1139,19 @@ class Bluetooth():
 		# Get the reference to the OpenOBEX
 		Bluetooth._managerOBEX= Bluetooth._sessionBus.get_object('org.openobex', '/org/openobex')
 		self.OBEX= dbus.Interface(Bluetooth._managerOBEX, 'org.openobex.Manager')
-		self.OBEX.connect_to_signal('SessionConnected', self.establishedOBEX)
+		self.signals.add('global', self.OBEX.connect_to_signal('SessionConnected', self.establishedOBEX))
 			
 		# Initialize the internal flags
 		self.isDiscovering= False
 		self.isRegistering= False
 		self.transferState= None
+		self.searchFilter= None
+		self.searchCallback= None
+		self.filterSupported= None
+		self.transferScheduled= False
+		self.audioScheduled= False
+		self.transferFile= None
+		self.pendingProperties= None
 			
 			
 			
@@ -225,6 +1275,204 @@ class Bluetooth():
 			raise BluetoothException("The name has an incorrect type (must be a string)")
 			
 			
+	##
+	#	Method which brings the bluetooth adapter to the given state. Only the properties whose value differs from the
+	#	current one are changed; all of them are requested back to back and their confirmations are waited together.
+	#	BlueZ 4 rejects a mode change while another one is pending, so only the final mode (Powered or Discoverable) is
+	#	requested: making the adapter visible turns it on, and turning it off makes it invisible
+	#	@param powered Indicates if the adapter must be turned On(True) or Off(False) (by default, unchanged)
+	#	@param discoverable Indicates if the adapter must be Visible(True) or Invisible(False) (by default, unchanged)
+	#	@param name String with the name of the bluetooth adapter (by default, unchanged)
+	#	@param discoverableTimeout Seconds that the adapter will be visible, 0 means forever (by default, unchanged)
+	#	@param timeOut Maximum seconds to wait for all the confirmations, by default, are 10s
+	#	@retval List List object with the names of the changed properties
+	#	@exception BluetoothException
+	#	@date 19/10/2026
+	#	@version 1.0
+	def apply(self, powered= None, discoverable= None, name= None, discoverableTimeout= None, timeOut= 10):
+		
+		# Check if the values are right
+		if name is not None and type(name) is not types.StringType:
+			raise BluetoothException("The name has an incorrect type (must be a string)")
+			
+		if discoverableTimeout is not None and type(discoverableTimeout) is not types.IntType:
+			raise BluetoothException("The discoverableTimeout has an incorrect type (must be an int)")
+			
+		if type(timeOut) is not types.IntType:
+			raise BluetoothException("The timeOut has an incorrect type (must be an int)")
+		
+		# Get the current state of the adapter
+		properties= self.adapter.GetProperties()
+		isPowered= properties['Powered'] == 1
+		
+		if discoverable is True and (powered is False or (powered is None and isPowered is False)):
+			raise BluetoothException("The bluetooth adapter is turned off")
+		
+		# Compute the changes of the properties which are not part of the mode
+		changes= []
+		expected= []
+		if name is not None and properties['Name'] != name:
+			changes.append( ('Name', name) )
+			
+		if discoverableTimeout is not None and properties['DiscoverableTimeout'] != discoverableTimeout:
+			changes.append( ('DiscoverableTimeout', dbus.UInt32(discoverableTimeout)) )
+			
+		expected.extend( [change[0] for change in changes] )
+		
+		# Compute the change of the mode, which is requested at last
+		isDiscoverable= properties['Discoverable'] == 1
+		if powered is True and isPowered is False:
+			if discoverable is True:
+				changes.append( ('Discoverable', True) )
+				expected.extend( ['Powered', 'Discoverable'] )
+			else:
+				changes.append( ('Powered', True) )
+				expected.append('Powered')
+				
+		elif powered is False and isPowered is True:
+			changes.append( ('Powered', False) )
+			expected.append('Powered')
+			if isDiscoverable is True:
+				expected.append('Discoverable')
+				
+		elif discoverable is not None and isDiscoverable is not discoverable:
+			changes.append( ('Discoverable', discoverable) )
+			expected.append('Discoverable')
+			
+		if len(changes) is 0:
+			return []
+		
+		# Request all the changes without waiting for each reply
+		self.pendingProperties= set(expected)
+		self.applyErrors= []
+		self.propertyLoop= gobject.MainLoop()
+		
+		for change in changes:
+			self.adapter.SetProperty(change[0], change[1], reply_handler= lambda: None, error_handler= self.applyError)
+		
+		# Wait for all the confirmations under one only deadline
+		self.applyTimer= gobject.timeout_add(timeOut * 1000, self.applyTimeOut)
+		self.propertyLoop.run()
+		
+		if self.applyTimer is not None:
+			gobject.source_remove(self.applyTimer)
+			self.applyTimer= None
+		
+		# Return the result of the changes
+		pending= self.pendingProperties
+		self.pendingProperties= None
+		
+		if len(self.applyErrors) > 0:
+			raise BluetoothException("Error setting the adapter properties: %s" % ', '.join(self.applyErrors))
+			
+		elif len(pending) > 0:
+			raise BluetoothException("Timeout waiting for the adapter properties: %s" % ', '.join(sorted(pending)))
+			
+		return expected
+	
+	
+	##
+	#	Method which will called when a property change requested by 'apply' fails
+	#	@param error DBusException with the information of the error
+	#	@date 19/10/2026
+	#	@version 1.0
+	def applyError(self, error):
+		
+		self.applyErrors.append(str(error))
+		self.propertyLoop.quit()
+	
+	
+	##
+	#	Method which will called when the deadline of 'apply' is reached
+	#	@date 19/10/2026
+	#	@version 1.0
+	def applyTimeOut(self):
+		
+		self.applyTimer= None
+		self.propertyLoop.quit()
+		return False
+		
+	
+	##
+	#	Method which gets the reference to a bluetooth adapter and receives its signals, forgetting the previous one
+	#	@param adapterReference String with the BlueZ address of the adapter
+	#	@date 19/10/2026
+	#	@version 1.0
+	def bindAdapter(self, adapterReference):
+		
+		self.signals.release('adapter')
+		self.adapterReference= adapterReference
+		self.adapterOwner= Bluetooth._systemBus.get_name_owner('org.bluez')
+		self.adapter= dbus.Interface(Bluetooth._systemBus.get_object('org.bluez', adapterReference), 'org.bluez.Adapter')
+		self.signals.add('adapter', self.adapter.connect_to_signal('PropertyChanged', self.propertyListener))
+		self.receiveDevices(None)
+		
+		# Share the scheduler of the adapter with the rest of objects of the class
+		if adapterReference not in Bluetooth._schedulers:
+			Bluetooth._schedulers[adapterReference]= RadioScheduler(self.adapter)
+		self.scheduler= Bluetooth._schedulers[adapterReference]
+	
+	
+	##
+	#	Method which subscribes to the DeviceFound signal of the adapter. With a list of addresses, the signal is only
+	#	delivered by the bus for those devices (arg0 match), so the rest of devices never reach Python
+	#	@param allow Set of MAC bluetooth addresses to receive, None to receive all the devices
+	#	@date 19/10/2026
+	#	@version 1.0
+	def receiveDevices(self, allow):
+		
+		self.signals.release('found')
+		if allow is None:
+			self.signals.add('found', self.adapter.connect_to_signal('DeviceFound', self.deviceFound))
+		else:
+			for address in allow:
+				self.signals.add('found', Bluetooth._systemBus.add_signal_receiver(self.deviceFound, signal_name= 'DeviceFound',
+					dbus_interface= 'org.bluez.Adapter', bus_name= 'org.bluez', path= self.adapterReference, arg0= address))
+	
+	
+	##
+	#	Method which receives the signals of BlueZ that inform of a new default adapter (i.e., after restarting
+	#	bluetoothd), gets the reference to it and reconnects the remembered devices if it is already turned on
+	#	@param path BlueZ address of the added or default adapter
+	#	@date 19/10/2026
+	#	@version 1.0
+	def adapterChanged(self, path):
+		
+		# Get the manager of the bluetoothd which is running now
+		try:
+			Bluetooth._manager= Bluetooth._systemBus.get_object('org.bluez', '/')
+			adapterReference= dbus.Interface(Bluetooth._manager, 'org.bluez.Manager').DefaultAdapter()
+			owner= Bluetooth._systemBus.get_name_owner('org.bluez')
+		except dbus.exceptions.DBusException:
+			return
+			
+		if adapterReference != self.adapterReference or owner != self.adapterOwner:
+			self.bindAdapter( adapterReference )
+			
+			# Otherwise, the reconnection will start with its Powered signal
+			if self.reconnector.enabled is True and self.getPower() is True:
+				self.reconnector.trigger()
+		
+	
+	##
+	#	Method which returns the number of signal receivers registered in the bus by this object
+	#	@retval Dictionary with the number of receivers of every scope (global, adapter, found, send, receive, session)
+	#	@date 19/10/2026
+	#	@version 1.0
+	def getSubscriptions(self):
+		
+		return self.signals.getCounts()
+		
+	
+	##
+	#	Method which removes from the bus all the signal receivers of this object
+	#	@date 19/10/2026
+	#	@version 1.0
+	def close(self):
+		
+		self.signals.releaseAll()
+		
+	
 	##
 	#	Method which will receive all the signals that inform of the value change of the bluetooth adapter properties 
 	#	@param name Name of the property changed
@@ -234,11 +1482,27 @@ class Bluetooth():
 	#	@author ManuelDeveloper (manueldeveloper@gmail.com)			
 	def propertyListener(self, name, value):
 		
+		# Report the inquiries of every process to the scheduler
+		if name == 'Discovering':
+			self.scheduler.discoveringChanged(value)
+		
+		# Reconnect the remembered devices when the adapter is turned on (the caller must run a main loop or call
+		# reconnect to process the results and the retries)
+		if name == 'Powered' and value == 1 and self.reconnector.enabled is True:
+			self.reconnector.trigger()
+		
+		# Stop the loop when all the properties expected by 'apply' are updated
+		if self.pendingProperties is not None:
+			self.pendingProperties.discard(name)
+			if len(self.pendingProperties) is 0:
+				self.propertyLoop.quit()
+		
 		# Stop the loop needed to update the value of the property
-		try:
-			self.propertyLoop.quit()
-		except:
-			pass
+		else:
+			try:
+				self.propertyLoop.quit()
+			except:
+				pass
 		print name
 		#if name != "Discovering":
 		#	self.propertyLoop.quit()
@@ -248,29 +1512,50 @@ class Bluetooth():
 	""" Search methods """
 	##
 	#	Method which starts up the search process
-	#	@param timeOut Duration in seconds of the search process, by default, are 5s
+	#	@param timeOut Duration in seconds of the search process counted from the request, so a queued search only uses the remaining time, by default, are 5s
+	#	@param searchFilter DiscoveryFilter object with the criteria of the devices to report (by default, None)
+	#	@param callback Function which will receive every tuple as soon as the device is found (by default, None)
 	#	@retval List List object whose content are tuples with the information of all devices found (MAC, Name, Type, CoD)
 	#	@retval None If the adapter has not found any device
 	#	@exception BluetoothExecption
 	#	@date 14/12/2012
 	#	@version 1.0
 	#	@author ManuelDeveloper (manueldeveloper@gmail.com)	
-	def search(self, timeOut= 5):
+	def search(self, timeOut= 5, searchFilter= None, callback= None):
 		
 		# Check if the timeOut is right
 		if type(timeOut) is types.IntType:
 		
+			# Check if the filter is right
+			if searchFilter is not None and not isinstance(searchFilter, DiscoveryFilter):
+				raise BluetoothException("The searchFilter has an incorrect type (must be a DiscoveryFilter)")
+		
 			# Check if there is a search process right now
 			if self.isDiscovering is False:
 				
 				# Set up the internal flags
 				self.devices= []
 				self.isDiscovering= True
+				self.searchFilter= searchFilter
+				self.searchCallback= callback
 				self.searchLoop= gobject.MainLoop()
 				
-				# Start up the search process
-				self.adapter.StartDiscovery()
-				gobject.timeout_add(timeOut * 1000, self.searchTimeOut)		
+				# Push down the filter to the bus and to the adapter
+				if searchFilter is not None:
+					if searchFilter.allow is not None:
+						self.receiveDevices(searchFilter.allow)
+					self.setDiscoveryFilter(searchFilter.toDBus())
+				
+				# Start up the search process when the radio is free, under a deadline from the request
+				self.searchRunning= False
+				self.searchTimer= gobject.timeout_add(timeOut * 1000, self.searchTimeOut)
+				try:
+					self.scheduler.requestDiscovery(self.searchStarted)
+				except BluetoothException as ex:
+					gobject.source_remove(self.searchTimer)
+					self.searchFinished()
+					raise ex
+					
 				self.searchLoop.run()
 				
 				# Return the the information
@@ -285,6 +1570,15 @@ class Bluetooth():
 			raise BluetoothException("The timeOut has an incorrect type (must be an int)")
 	
 	
+	##
+	#	Method which will called when the scheduler starts up the search process
+	#	@date 19/10/2026
+	#	@version 1.0
+	def searchStarted(self):
+		
+		self.searchRunning= True
+	
+	
 	##
 	#	Method which will called when the timeout of search process is reached and stops the process
 	#	@date 14/12/2012
@@ -292,12 +1586,61 @@ class Bluetooth():
 	#	@author ManuelDeveloper (manueldeveloper@gmail.com)	
 	def searchTimeOut(self):
 		
-		self.adapter.StopDiscovery()
-		self.isDiscovering= False
+		# Stop the search process or, if it is still queued, remove it
+		if self.searchRunning is True:
+			self.searchRunning= False
+			self.scheduler.endDiscovery()
+		else:
+			self.scheduler.cancelDiscovery(self.searchStarted)
+			
+		self.searchFinished()
 		self.searchLoop.quit()
 		return False
 	
 	
+	##
+	#	Method which resets the state of the search process and removes the filter pushed down
+	#	@date 19/10/2026
+	#	@version 1.0
+	def searchFinished(self):
+		
+		self.isDiscovering= False
+		
+		# Remove the filter pushed down to the bus and to the adapter
+		if self.searchFilter is not None:
+			if self.searchFilter.allow is not None:
+				self.receiveDevices(None)
+			self.searchFilter= None
+			self.setDiscoveryFilter(dbus.Dictionary({}, signature= 'sv'))
+	
+	
+	##
+	#	Method which sets the discovery filter of the bluetooth adapter if its object exports the BlueZ 5 interface
+	#	(org.bluez.Adapter1). The BlueZ 4 adapters do not export it, so there the filter is only applied by deviceFound
+	#	@param criteria Dictionary with the filter in the BlueZ 5 format
+	#	@retval True If the adapter has accepted the filter
+	#	@retval False If the stack does not support it or the filter has been rejected
+	#	@date 19/10/2026
+	#	@version 1.0
+	def setDiscoveryFilter(self, criteria):
+		
+		# Check if the stack has already rejected the filters
+		if self.filterSupported is False:
+			return False
+			
+		try:
+			adapter= dbus.Interface(Bluetooth._systemBus.get_object('org.bluez', self.adapter.object_path), 'org.bluez.Adapter1')
+			adapter.SetDiscoveryFilter(criteria)
+			self.filterSupported= True
+			return True
+			
+		except dbus.exceptions.DBusException as ex:
+			# Only remember the lack of support, a rejected filter must not disable the next ones
+			if ex.get_dbus_name() in ('org.freedesktop.DBus.Error.UnknownMethod', 'org.freedesktop.DBus.Error.UnknownInterface', 'org.freedesktop.DBus.Error.UnknownObject'):
+				self.filterSupported= False
+			return False
+	
+	
 	##
 	#	Method which will called when the bluetooth adapter find a new device and will save its information in a general list
 	#	@param address Bluetooth MAC of the discovered device
@@ -310,6 +1653,10 @@ class Bluetooth():
 		# First, check if there is a search process running
 		if self.isDiscovering is True:
 			
+			# Discard the device if it does not pass the filter
+			if self.searchFilter is not None and not self.searchFilter.match(address, properties):
+				return
+			
 			# Get the important information about the discovered device
 			address= properties['Address']
 			cod= properties['Class']
@@ -327,6 +1674,10 @@ class Bluetooth():
 			# Add the information to the general list
 			self.devices.append( (address, name, icon, cod) )
 			
+			# Report the device right now if it has been requested
+			if self.searchCallback is not None:
+				self.searchCallback( (address, name, icon, cod) )
+			
 			
 			
 			
@@ -349,12 +1700,18 @@ class Bluetooth():
 		if properties['State'] == "disconnected": # The device is disconnected		
 			self.deviceConnected= False					
 			self.propertyLoopAD2P= gobject.MainLoop()
+			
+			# Audio connections have priority over the discovery processes
+			self.audioScheduled= True
+			self.scheduler.beginOperation(RadioScheduler.AUDIO)
 					
 			try:
 				device.Connect() # Connect the device
 				self.propertyLoopAD2P.run()
 			except:
 				raise BluetoothException("Error during the connection process")
+			finally:
+				self.finishAudio()
 				
 		elif properties['State'] == "connected": # The device is connected			
 			self.deviceConnected= True
@@ -381,12 +1738,26 @@ class Bluetooth():
 			# The device is correctly connected
 			if value == "connected":
 				self.deviceConnected= True
+				self.finishAudio()
 				self.propertyLoopAD2P.quit()
 			
 			# The device is not connected for some reason
 			elif value == "disconnected":
 				self.deviceConnected= False
+				self.finishAudio()
 				self.propertyLoopAD2P.quit()
+	
+	
+	##
+	#	Method which tells the scheduler that the AD2P connection process has finished. It is called as soon as the
+	#	state of the connection changes and it only acts once
+	#	@date 19/10/2026
+	#	@version 1.0
+	def finishAudio(self):
+		
+		if self.audioScheduled is True:
+			self.audioScheduled= False
+			self.scheduler.endOperation(RadioScheduler.AUDIO)
 			
 			
 			
@@ -407,11 +1778,14 @@ class Bluetooth():
 		
 		if properties['Connected'] == 0: # The device is disconnected
 		
+			self.scheduler.beginOperation(RadioScheduler.CONNECTION)
 			try:
 				device.Connect() # Connect the device
 				self.deviceConnected= True
 			except:
 				raise BluetoothException("Error during the connection process")
+			finally:
+				self.scheduler.endOperation(RadioScheduler.CONNECTION)
 		
 		else: # The device is connected
 			self.deviceConnected= True
@@ -444,7 +1818,7 @@ class Bluetooth():
 		properties= device.GetProperties()
 			
 		# Return the information
-		if properties['Connected'] is 1:
+		if properties['Connected'] == 1:
 			return True
 		else:
 			return False
@@ -470,11 +1844,13 @@ class Bluetooth():
 		# Get the reference to the device
 		device= dbus.Interface( Bluetooth._systemBus.get_object('org.bluez', reference), 'org.bluez.Device' )
 			
-		# Disconnect the device
+		# Disconnect the device and do not reconnect it anymore
 		try:
 			device.Disconnect()
 		except:
 			pass
+			
+		self.reconnector.forget( address )
 				
 		return True
 
@@ -497,6 +1873,9 @@ class Bluetooth():
 			
 		if reference == None:
 			
+			# The cached services of a device unknown by BlueZ are stale, they are saved again when it is browsed
+			self.services.remove( address )
+			
 			# Register the device in the system
 			try:
 				reference= self.adapter.CreateDevice( address )
@@ -505,6 +1884,34 @@ class Bluetooth():
 		
 		# Return the result of the registration process
 		return reference
+	
+	
+	##
+	#	Method which returns the service records (SDP) of a device, browsing them only if they are not in the cache
+	#	@param address MAC bluetooth address of the device
+	#	@param refresh Indicates if the services must be browsed again although they are in the cache (by default, False)
+	#	@retval Dictionary with the service records (XML) by handle
+	#	@exception BluetoothException
+	#	@date 19/10/2026
+	#	@version 1.0
+	def getServices(self, address, refresh= False):
+		
+		# Check if the records are in the cache
+		entry= self.services.get( address )
+		if refresh is False and entry is not None and len(entry['records']) > 0:
+			return entry['records']
+			
+		# Browse the services of the device
+		reference= self.register( address )
+		device= dbus.Interface( Bluetooth._systemBus.get_object('org.bluez', reference), 'org.bluez.Device' )
+		try:
+			records= device.DiscoverServices('')
+			properties= device.GetProperties()
+		except:
+			raise BluetoothException("Error during the service discovery process")
+			
+		self.services.update( address, properties.get('UUIDs', []), records )
+		return self.services.get( address )['records']
 		
 	
 	##
@@ -523,28 +1930,69 @@ class Bluetooth():
 		except BluetoothException as ex:
 			raise ex
 			
-		# Get the Icon of the device and connect with it according to the gotten icon
-		device= dbus.Interface( Bluetooth._systemBus.get_object('org.bluez', reference), 'org.bluez.Device' )
-		properties= device.GetProperties()
+		# Get the profile of the device from its services
+		profile= self.services.getProfile( address )
+		
+		# Unknown services, save the ones already browsed by BlueZ and, if they are not enough, get the profile
+		# according to the Icon of the device
+		if profile is None:
+			device= dbus.Interface( Bluetooth._systemBus.get_object('org.bluez', reference), 'org.bluez.Device' )
+			properties= device.GetProperties()
+			self.services.update( address, properties.get('UUIDs', []) )
+			profile= self.services.getProfile( address )
+			
+			if profile is None:
+				if properties.get('Icon', '').find("audio") != -1:
+					profile= 'audio'
+				elif properties.get('Icon', '').find("input") != -1:
+					profile= 'input'
 			
 		# Audio
-		if properties['Icon'].find("audio") != -1:
+		if profile == 'audio':
 			try:
 				print "conectar audio"
-				return self.connectAD2P( reference )					
+				connected= self.connectAD2P( reference )					
 			except BluetoothException as ex:					
 				raise ex
 			
 		# Input
-		elif properties['Icon'].find("input") != -1:
+		elif profile == 'input':
 			try:
-				self.connectInput( address )
+				connected= self.connectInput( reference )
 			except BluetoothException as ex:
 				raise ex
+				
+		# Object Push
+		elif profile == 'opp':
+			raise BluetoothException("The device only accepts file transfers (use sendFile)")
 			
 		# Error		
 		else:
 			raise BluetoothException("Incorrect device type to set a connection")
+			
+		# Remember the device to reconnect it when the adapter is turned on
+		if connected is True:
+			self.reconnector.remember( address, profile )
+			
+		return connected
+		
+	
+	##
+	#	Method which reconnects in parallel the last connected audio and input devices. The reconnection starts by
+	#	itself when the adapter is turned on or bluetoothd is restarted, but its replies and retries are only processed
+	#	while a main loop is running; without one (i.e., after setPower) this method must be called with wait=True
+	#	@param wait Indicates if the method must wait for the result of the reconnections (by default, True)
+	#	@param timeOut Maximum seconds to wait (by default, long enough for all the retries of the absent devices)
+	#	@retval Dictionary with the result (True, False or None if it is still pending) of every device
+	#	@date 19/10/2026
+	#	@version 1.0
+	def reconnect(self, wait= True, timeOut= None):
+		
+		self.reconnector.trigger()
+		if wait is True:
+			return self.reconnector.wait(timeOut)
+		else:
+			return dict(self.reconnector.results)
 
 
 			
@@ -571,25 +2019,35 @@ class Bluetooth():
 			self.pathFile= pathFile
 			self.progressBar= progressBar
 			
+			# Free the radio of inquiries during the transfering
+			self.transferScheduled= True
+			self.scheduler.beginOperation(RadioScheduler.TRANSFER)
+			
 			# Create a session with the device
 			try:
 				self.pathSession= self.OBEX.CreateBluetoothSession(address, '00:00:00:00:00:00', 'opp')
 			except:
+				self.finishTransfer()
+				self.transferState= None
 				raise BluetoothException("The device don't accept this kind of connection")
 				
 			# Get the information about the connection
 			self.OBEXSession= dbus.Interface(Bluetooth._sessionBus.get_object('org.openobex', self.pathSession) , 'org.openobex.Session')
 			
 			# Indicate the methods which will receive all the signals
-			self.OBEXSession.connect_to_signal('TransferStarted', self.startOBEX)
-			self.OBEXSession.connect_to_signal('TransferProgress', self.progressOBEX)
-			self.OBEXSession.connect_to_signal('TransferCompleted', self.endOBEX)
-			self.OBEXSession.connect_to_signal('ErrorOccurred', self.errorOBEX)
-			self.OBEXSession.connect_to_signal('Cancelled', self.cancelOBEX)
+			self.signals.add('send', self.OBEXSession.connect_to_signal('TransferStarted', self.startOBEX))
+			self.signals.add('send', self.OBEXSession.connect_to_signal('TransferProgress', self.progressOBEX))
+			self.signals.add('send', self.OBEXSession.connect_to_signal('TransferCompleted', self.endOBEX))
+			self.signals.add('send', self.OBEXSession.connect_to_signal('ErrorOccurred', self.errorOBEX))
+			self.signals.add('send', self.OBEXSession.connect_to_signal('Cancelled', self.cancelOBEX))
 			
 			# Start the transfering process
 			self.loopOBEX= gobject.MainLoop()
 			self.loopOBEX.run()
+			self.finishTransfer()
+			
+			# Remove the receivers of the session
+			self.signals.release('send')
 			
 			# Return the result of the transfering process
 			if self.transferState == "sended":
@@ -647,11 +2105,18 @@ class Bluetooth():
 			servers= self.OBEX.GetServerList()
 			
 			self.serverInterface= dbus.Interface(Bluetooth._sessionBus.get_object('org.openobex', servers[0]), 'org.openobex.Server')
-			self.serverInterface.connect_to_signal('SessionCreated', self.clientConnected)
+			self.signals.add('receive', self.serverInterface.connect_to_signal('SessionCreated', self.clientConnected))
 			
 			# Start the transfering process
 			self.loopOBEX= gobject.MainLoop()
 			self.loopOBEX.run()
+			
+			# Free the radio if a client has been connected
+			self.finishTransfer()
+				
+			# Remove the receivers of the server and the client session
+			self.signals.release('session')
+			self.signals.release('receive')
 				
 			# Return the result of the transfering process
 			if self.transferState == "received":
@@ -682,12 +2147,18 @@ class Bluetooth():
 		# Get the reference to the created client session
 		self.clientSession= dbus.Interface(Bluetooth._sessionBus.get_object('org.openobex', path), 'org.openobex.ServerSession')
 		
-		# Indicate the methods which will receive all the signals
-		self.clientSession.connect_to_signal('TransferStarted', self.startOBEX)
-		self.clientSession.connect_to_signal('TransferProgress', self.progressOBEX)
-		self.clientSession.connect_to_signal('TransferCompleted', self.endOBEX)		
-		self.clientSession.connect_to_signal('ErrorOccurred', self.errorOBEX)
-		self.clientSession.connect_to_signal('Cancelled', self.cancelOBEX)	
+		# Free the radio of inquiries during the transfering
+		if self.transferScheduled is False:
+			self.transferScheduled= True
+			self.scheduler.beginOperation(RadioScheduler.TRANSFER)
+		
+		# Indicate the methods which will receive all the signals, forgetting the previous session
+		self.signals.release('session')
+		self.signals.add('session', self.clientSession.connect_to_signal('TransferStarted', self.startOBEX))
+		self.signals.add('session', self.clientSession.connect_to_signal('TransferProgress', self.progressOBEX))
+		self.signals.add('session', self.clientSession.connect_to_signal('TransferCompleted', self.endOBEX))
+		self.signals.add('session', self.clientSession.connect_to_signal('ErrorOccurred', self.errorOBEX))
+		self.signals.add('session', self.clientSession.connect_to_signal('Cancelled', self.cancelOBEX))
 			
 	
 	##
@@ -704,8 +2175,9 @@ class Bluetooth():
 			# Accept the incoming file
 			#self.clientSession.Accept()"""
 		
-		# Get the size of the transfered file
+		# Get the size and the name of the transfered file
 		self.sizeFile= total_bytes
+		self.transferFile= (filename, local_path)
 	
 	
 	##
@@ -754,9 +2226,22 @@ class Bluetooth():
 			except:
 				pass			
 		
+		self.finishTransfer()
 		self.loopOBEX.quit()
 	
 	
+	##
+	#	Method which tells the scheduler that the transfer has finished. It is called as soon as the transfer ends, so a
+	#	search queued from a nested loop can start before the transfer loop returns, and it only acts once
+	#	@date 19/10/2026
+	#	@version 1.0
+	def finishTransfer(self):
+		
+		if self.transferScheduled is True:
+			self.transferScheduled= False
+			self.scheduler.endOperation(RadioScheduler.TRANSFER)
+	
+	
 	##
 	#	Method which receives the signal when an error appears during the transfering
 	#	@param name_error Name of the error
@@ -788,6 +2273,7 @@ class Bluetooth():
 			except:
 				pass
 				
+		self.finishTransfer()
 		self.loopOBEX.quit()
 	
 	
@@ -816,4 +2302,191 @@ class Bluetooth():
 			except:
 				pass
 		
+		self.finishTransfer()
 		self.loopOBEX.quit()		
+
+
+
+
+
+
+
+
+""" Command-line entry point """
+##
+#	Function which writes a record in the output as one JSON object per line
+#	@param output File object where the record is written
+#	@param record Dictionary with the information to write
+#	@date 19/10/2026
+#	@version 1.0
+def emit(output, record):
+	
+	output.write(json.dumps(record) + '\n')
+	output.flush()
+
+
+##
+#	Function which returns the items of a batch, given as arguments or, if there are not arguments (or '-'), as lines of
+#	the standard input. The empty lines and the comments ('#') are ignored
+#	@param arguments List of items given as arguments
+#	@retval Generator with the items of the batch
+#	@date 19/10/2026
+#	@version 1.0
+def batch(arguments):
+	
+	if len(arguments) is 0 or arguments == ['-']:
+		for line in iter(sys.stdin.readline, ''):
+			line= line.strip()
+			if len(line) > 0 and not line.startswith('#'):
+				yield line
+	else:
+		for argument in arguments:
+			yield argument
+
+
+##
+#	Function which runs an action for every item of a batch and writes its result, or its error, as soon as it ends
+#	@param output File object where the results are written
+#	@param items Generator with the items of the batch
+#	@param action Function which receives an item and returns the dictionary with its result
+#	@retval 0 If all the items have been processed correctly
+#	@retval 1 If some item has failed
+#	@date 19/10/2026
+#	@version 1.0
+def runBatch(output, items, action):
+	
+	status= 0
+	for item in items:
+		try:
+			emit(output, action(item))
+		except (BluetoothException, dbus.exceptions.DBusException) as ex:
+			emit(output, {'item': item, 'error': str(ex)})
+			status= 1
+			
+	return status
+
+
+##
+#	Function which parses the command line and runs the requested subcommand over one only bluetooth connection
+#	@param argv List with the arguments of the command line (by default, sys.argv)
+#	@retval Exit code of the process
+#	@date 19/10/2026
+#	@version 1.0
+def main(argv= None):
+	
+	parser= argparse.ArgumentParser(prog= 'python -m bluetooth', description= 'Bluetooth adapter management with NDJSON output')
+	subparsers= parser.add_subparsers(dest= 'command')
+	
+	# Search
+	scan= subparsers.add_parser('scan', help= 'search the devices in range')
+	scan.add_argument('--timeout', type= int, default= 5, help= 'duration in seconds of the search process')
+	scan.add_argument('--major-class', type= lambda value: int(value, 0), action= 'append', help= 'major device class of the CoD')
+	scan.add_argument('--rssi', type= int, help= 'minimum RSSI in dBm')
+	scan.add_argument('--uuid', action= 'append', help= 'service UUID announced by the device')
+	scan.add_argument('--name-prefix', help= 'prefix of the name of the device')
+	scan.add_argument('--allow', action= 'append', help= 'MAC address accepted')
+	scan.add_argument('--deny', action= 'append', help= 'MAC address discarded')
+	
+	# Status
+	status= subparsers.add_parser('status', help= 'status of the adapter or, if MACs are given, of the devices')
+	status.add_argument('addresses', nargs= '*', help= "MAC addresses ('-' to read them from stdin)")
+	
+	# Connections
+	connect= subparsers.add_parser('connect', help= 'connect the devices')
+	connect.add_argument('addresses', nargs= '*', help= 'MAC addresses (by default, read from stdin)')
+	disconnect= subparsers.add_parser('disconnect', help= 'disconnect the devices')
+	disconnect.add_argument('addresses', nargs= '*', help= 'MAC addresses (by default, read from stdin)')
+	
+	# File transfering
+	send= subparsers.add_parser('send', help= 'send files over OPP')
+	send.add_argument('address', nargs= '?', help= "MAC address (by default, a manifest with 'MAC path' lines is read from stdin)")
+	send.add_argument('path', nargs= '?', help= 'path of the file')
+	receive= subparsers.add_parser('receive', help= 'receive files over OPP')
+	receive.add_argument('--count', type= int, default= 1, help= 'number of files to receive')
+	
+	arguments= parser.parse_args(argv)
+	
+	# Check the arguments before connecting with the bus
+	if arguments.command == 'send' and arguments.address is not None and arguments.path is None:
+		parser.error("the path of the file is required")
+	
+	# Keep the messages of the API out of the NDJSON stream
+	output= sys.stdout
+	sys.stdout= sys.stderr
+	try:
+		return runCommand(arguments, output)
+	finally:
+		sys.stdout= output
+
+
+##
+#	Function which runs a subcommand over one only bluetooth connection
+#	@param arguments Namespace with the parsed arguments of the command line
+#	@param output File object where the results are written
+#	@retval Exit code of the process
+#	@date 19/10/2026
+#	@version 1.0
+def runCommand(arguments, output):
+	
+	# Get the connection with the bluetooth adapter for the whole batch
+	try:
+		bluetooth= Bluetooth()
+	except (BluetoothException, dbus.exceptions.DBusException) as ex:
+		emit(output, {'error': str(ex)})
+		return 1
+	
+	# Run the subcommand
+	if arguments.command == 'scan':
+		searchFilter= None
+		if any(criteria is not None for criteria in (arguments.major_class, arguments.rssi, arguments.uuid, arguments.name_prefix, arguments.allow, arguments.deny)):
+			searchFilter= DiscoveryFilter(arguments.major_class, arguments.rssi, arguments.uuid, arguments.name_prefix, arguments.allow, arguments.deny)
+			
+		def found(device):
+			emit(output, {'address': device[0], 'name': device[1], 'icon': device[2], 'class': device[3]})
+			
+		return runBatch(output, ['scan'], lambda item: {'found': len(bluetooth.search(arguments.timeout, searchFilter, found) or [])})
+		
+	elif arguments.command == 'status':
+		if len(arguments.addresses) is 0:
+			def adapterStatus(item):
+				powered= bluetooth.getPower()
+				return {'powered': powered, 'discoverable': powered and bluetooth.getVisibility(), 'name': bluetooth.getName()}
+				
+			return runBatch(output, ['adapter'], adapterStatus)
+			
+		return runBatch(output, batch(arguments.addresses), lambda address: {'address': address, 'connected': bluetooth.isConnected(address)})
+		
+	elif arguments.command == 'connect':
+		return runBatch(output, batch(arguments.addresses), lambda address: {'address': address, 'connected': bluetooth.connectDevice(address)})
+		
+	elif arguments.command == 'disconnect':
+		return runBatch(output, batch(arguments.addresses), lambda address: {'address': address, 'disconnected': bluetooth.disconnectDevice(address)})
+		
+	elif arguments.command == 'send':
+		if arguments.address is None:
+			entries= batch([])
+		else:
+			entries= ['%s %s' % (arguments.address, arguments.path)]
+			
+		def sendEntry(entry):
+			fields= entry.split(None, 1)
+			if len(fields) is not 2:
+				raise BluetoothException("The entry must be 'MAC path'")
+			return {'address': fields[0], 'file': fields[1], 'sent': bluetooth.sendFile(fields[0], fields[1])}
+			
+		return runBatch(output, entries, sendEntry)
+		
+	elif arguments.command == 'receive':
+		def receiveEntry(item):
+			bluetooth.transferFile= None
+			received= bluetooth.receiveFile()
+			filename, path= bluetooth.transferFile or (None, None)
+			return {'received': received, 'file': filename, 'path': path}
+			
+		return runBatch(output, xrange(arguments.count), receiveEntry)
+
+
+
+
+if __name__ == '__main__':
+	sys.exit(main())